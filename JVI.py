@@ -5,11 +5,51 @@ import json
 import xlrd
 import xlwt
 from xlutils.copy import copy as xl_copy
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
 import shutil
-from datetime import datetime
+import asyncio
+import threading
+import queue
+import re
+import socket
+import time
+import hashlib
+import functools
+import numbers
+import lzma
+import struct
+import zlib
+import glob
+import sqlite3
+import multiprocessing
+import numpy as np
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta
 
 CONFIG_FILE = "config.json"
 DATA_FILE = "data.json"
+SHARD_DIR = "data_shards"
+SHARD_MANIFEST = "manifest.json"
+SHARD_LOCK = "manifest.lock"
+SHARD_LOCK_TIMEOUT = 15
+SHARD_LOCK_STALE = 120
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_LIMIT = 20
+# Config that describes the data itself; paths, ports and storage/export choices stay local.
+SNAPSHOT_CONFIG_KEYS = ["store_col1", "store_col2", "import_template_areas", "store_sheet_areas",
+                        "export_inventory_areas", "export_foil_areas"]
+FOIL_HISTORY_CACHE = "foil_history_cache.json"
+FOIL_FORECAST_WEEKS = 6
+INVENTORY_INDEX_DB = "inventory_history.db"
+BUNDLE_MAGIC = b"JVIB"
+BUNDLE_VERSION = 1
+
+UPLOAD_SERVER_HOST = "127.0.0.1"
+UPLOAD_SERVER_PORT = 8765
+UPLOAD_MAX_BYTES = 20 * 1024 * 1024
 
 DEFAULT_STORE_COL1 = ["001", "003", "004", "005", "007", "008", "010", "011", "012", "014", "015", "017", "018", "019"]
 DEFAULT_STORE_COL2 = ["201", "202", "203", "204", "205", "206", "207", "208", "209", "211", "214", "215", "216", "217"]
@@ -21,6 +61,697 @@ def colname2idx(name):
         idx = idx * 26 + (ord(c) - ord('A') + 1)
     return idx - 1
 
+CELL_REF = re.compile(r"^\s*([A-Za-z]{1,3})([0-9]{1,7})\s*$")
+
+AREA_DEFAULTS = {
+    "import_template_areas": {"date_cell": "C4", "pack_range": "A8:A44", "size_range": "B8:B44", "desc_range": "C8:C44"},
+    "store_sheet_areas": {"store_cell": "G3", "inventory_range": "D8:D44", "foil_range": "G8:G11"},
+    "export_inventory_areas": {"date_cell": "A2", "item_start_cell": "A5", "store_col_start": "B5"},
+    "export_foil_areas": {"date_cell": "A2", "store_start_cell": "B5"}
+}
+
+@functools.lru_cache(maxsize=None)
+def parse_cell_ref(ref):
+    match = CELL_REF.match(str(ref))
+    if not match or int(match.group(2)) < 1:
+        raise ValueError(f"Invalid cell reference '{ref}'")
+    return int(match.group(2)) - 1, colname2idx(match.group(1))
+
+@functools.lru_cache(maxsize=None)
+def parse_area_ref(ref):
+    parts = str(ref).split(":")
+    if len(parts) > 2:
+        raise ValueError(f"Invalid range '{ref}'")
+    r1, c1 = parse_cell_ref(parts[0])
+    r2, c2 = parse_cell_ref(parts[-1])
+    return CellArea(min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2))
+
+class CellArea:
+    # Rectangular sheet area, zero-based and inclusive.
+    __slots__ = ("r1", "c1", "r2", "c2")
+
+    def __init__(self, r1, c1, r2, c2):
+        self.r1, self.c1, self.r2, self.c2 = r1, c1, r2, c2
+
+    def __iter__(self):
+        return iter((self.r1, self.c1, self.r2, self.c2))
+
+    @property
+    def cell(self):
+        return self.r1, self.c1
+
+    @property
+    def n_rows(self):
+        return self.r2 - self.r1 + 1
+
+    @property
+    def n_cols(self):
+        return self.c2 - self.c1 + 1
+
+    def block(self, sheet):
+        # One bulk row_values call per row; cells outside the sheet read as "".
+        width = self.n_cols
+        rows = []
+        for r in range(self.r1, self.r2 + 1):
+            values = list(sheet.row_values(r, self.c1, self.c2 + 1)) if r < sheet.nrows and self.c1 < sheet.ncols else []
+            rows.append(values + [""] * (width - len(values)))
+        return rows
+
+    def values(self, sheet):
+        # Flattened column by column, so "D8:E44" continues from D44 to E8.
+        block = self.block(sheet)
+        return [row[c] for c in range(self.n_cols) for row in block]
+
+class AreaPlan:
+    # Every configured cell and range parsed once. Invalid references are collected in
+    # errors and fall back to the defaults so a bad entry cannot break imports or exports.
+    def __init__(self, config):
+        self.areas = {}
+        self.errors = []
+        for group, defaults in AREA_DEFAULTS.items():
+            configured = config.get(group, {}) or {}
+            compiled = {}
+            for field, default in defaults.items():
+                ref = configured.get(field) or default
+                try:
+                    compiled[field] = parse_area_ref(ref)
+                except ValueError as e:
+                    self.errors.append(f"{group}.{field}: {e}")
+                    compiled[field] = parse_area_ref(default)
+            self.areas[group] = compiled
+
+    def area(self, group, field):
+        return self.areas[group][field]
+
+    def cell(self, group, field):
+        return self.areas[group][field].cell
+
+    @staticmethod
+    def validate(values):
+        errors = []
+        for field, ref in values.items():
+            try:
+                parse_area_ref(ref)
+            except ValueError as e:
+                errors.append(f"{field}: {e}")
+        return errors
+
+def idx2colname(idx):
+    name = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        name = chr(ord('A') + rem) + name
+    return name
+
+class ExcelFormula(str):
+    # Marks a cell-plan value as a formula (written without the leading "=").
+    pass
+
+class XlsxSheetReader:
+    # Read-only view of an .xlsx sheet with the xlrd calls the history readers use.
+    def __init__(self, path):
+        book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            self.rows = [tuple("" if v is None else v for v in row)
+                         for row in book.worksheets[0].iter_rows(values_only=True)]
+        finally:
+            book.close()
+        self.nrows = len(self.rows)
+        self.ncols = max((len(row) for row in self.rows), default=0)
+
+    def cell_value(self, row, col):
+        values = self.rows[row]
+        return values[col] if col < len(values) else ""
+
+    def row_values(self, row, start_col=0, end_col=None):
+        return list(self.rows[row][start_col:end_col])
+
+def open_export_sheet(path):
+    if path.lower().endswith(".xlsx"):
+        return XlsxSheetReader(path)
+    return xlrd.open_workbook(path).sheet_by_index(0)
+
+def store_key(k):
+    try:
+        return f"{int(float(k)):03}"
+    except (TypeError, ValueError):
+        return str(k).zfill(3)
+
+def item_key(description, size, case_qty):
+    # Stable identity of a template row, independent of where the row sits in the sheet.
+    return "|".join(" ".join(str(part).split()).lower() for part in (description, size, case_qty))
+
+def template_keys(items):
+    # One key per template row. Blank rows get "" (they carry no count); a repeated
+    # (description, size, case_qty) gets an occurrence suffix so each row keeps its own count.
+    keys = []
+    seen = {}
+    for item in items:
+        key = item_key(item.get("description", ""), item.get("size", ""), item.get("case_qty", ""))
+        if key == item_key("", "", ""):
+            keys.append("")
+            continue
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}|#{seen[key]}")
+    return keys
+
+def iter_json_bundle(f, chunk_size=1 << 16):
+    # Incremental reader for exported data bundles. Yields ("data", store, record) for each
+    # store and (key, None, value) for every other top-level section, so only one store
+    # record has to be held in the buffer at a time.
+    decoder = json.JSONDecoder()
+    state = {"buf": "", "pos": 0, "eof": False}
+
+    def fill():
+        chunk = f.read(chunk_size)
+        if not chunk:
+            state["eof"] = True
+        state["buf"] = state["buf"][state["pos"]:] + chunk
+        state["pos"] = 0
+
+    def peek():
+        while True:
+            buf, pos = state["buf"], state["pos"]
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            state["pos"] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if state["eof"]:
+                raise ValueError("Unexpected end of data file")
+            fill()
+
+    def expect(ch):
+        if peek() != ch:
+            raise ValueError(f"Expected '{ch}' in data file")
+        state["pos"] += 1
+
+    def value():
+        peek()
+        while True:
+            try:
+                val, end = decoder.raw_decode(state["buf"], state["pos"])
+                # A number ending exactly at the buffer edge may continue in the next chunk.
+                if end < len(state["buf"]) or state["eof"] or not isinstance(val, (int, float)):
+                    state["pos"] = end
+                    return val
+            except json.JSONDecodeError:
+                if state["eof"]:
+                    raise
+            fill()
+
+    expect("{")
+    while peek() != "}":
+        key = value()
+        expect(":")
+        if key == "data" and peek() == "{":
+            state["pos"] += 1
+            while peek() != "}":
+                store = value()
+                expect(":")
+                yield "data", store, value()
+                if peek() == ",":
+                    state["pos"] += 1
+            state["pos"] += 1
+        else:
+            yield key, None, value()
+        if peek() == ",":
+            state["pos"] += 1
+
+def parse_export_date(path, prefix):
+    # Export file names carry the template date, e.g. "Foil Pan Order 03-14-2025.xls".
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem.startswith(prefix):
+        text = stem[len(prefix):].strip()
+        for fmt in ("%m-%d-%Y", "%m-%d-%y", "%Y-%m-%d", "%m.%d.%Y"):
+            try:
+                return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+            except ValueError:
+                pass
+    return datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+
+def read_foil_order_file(path, store_row, store_col):
+    # Module level so it can run in a worker process.
+    sheet = open_export_sheet(path)
+    stores = {}
+    for row in range(store_row, sheet.nrows):
+        if store_col >= sheet.ncols:
+            break
+        cell = sheet.cell_value(row, store_col)
+        if cell in ("", None):
+            break
+        counts = []
+        for j in range(4):
+            try:
+                counts.append(float(sheet.cell_value(row, store_col + 1 + j)))
+            except (IndexError, TypeError, ValueError):
+                counts.append(None)
+        stores[store_key(cell)] = counts
+    return {"date": parse_export_date(path, "Foil Pan Order"), "stores": stores}
+
+def read_inventory_export_file(path, item_row, item_col, store_col, fallback_stores):
+    # Module level so it can run in a worker process. Store numbers are taken from the header
+    # row above the first item when the template has one, otherwise from the configured order.
+    sheet = open_export_sheet(path)
+    stores = []
+    if item_row > 0:
+        for col in range(store_col, sheet.ncols):
+            cell = sheet.cell_value(item_row - 1, col)
+            if (isinstance(cell, numbers.Number) and not isinstance(cell, bool)) or \
+                    (isinstance(cell, str) and cell.strip().isdigit()):
+                stores.append(store_key(cell))
+            else:
+                break
+    if not stores:
+        stores = list(fallback_stores)
+    rows = []
+    for row in range(item_row, sheet.nrows):
+        item = str(sheet.cell_value(row, item_col)).strip() if item_col < sheet.ncols else ""
+        if not item:
+            break
+        for i, store in enumerate(stores):
+            if store_col + i >= sheet.ncols:
+                break
+            try:
+                count = float(sheet.cell_value(row, store_col + i))
+            except (TypeError, ValueError):
+                continue
+            rows.append((item, store, count))
+    return {"date": parse_export_date(path, "Final Inventory"), "rows": rows}
+
+class InventoryHistoryIndex:
+    # SQLite index of every Final Inventory export: one row per item, store and week.
+    # Files are tracked by mtime so each update only parses exports that are new or changed.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, date TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS counts (path TEXT, item TEXT, store TEXT, date TEXT, count REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS counts_lookup ON counts (item, store, date)")
+            db.execute("CREATE INDEX IF NOT EXISTS counts_path ON counts (path)")
+            db.execute("CREATE INDEX IF NOT EXISTS files_date ON files (date, mtime)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def update(self, folder, item_row, item_col, store_col, fallback_stores):
+        with self.lock:
+            paths = glob.glob(os.path.join(glob.escape(folder), "Final Inventory *.xls"))
+            paths += glob.glob(os.path.join(glob.escape(folder), "Final Inventory *.xlsx"))
+            mtimes = {os.path.abspath(p): os.path.getmtime(p) for p in paths}
+            with self._connect() as db:
+                indexed = dict(db.execute("SELECT path, mtime FROM files"))
+            stale = [p for p in indexed if p not in mtimes]
+            todo = [p for p, m in mtimes.items() if indexed.get(p) != m]
+            results = {}
+            if len(todo) > 4:
+                with ProcessPoolExecutor() as pool:
+                    futures = {p: pool.submit(read_inventory_export_file, p, item_row, item_col, store_col, fallback_stores)
+                               for p in todo}
+                for p, future in futures.items():
+                    try:
+                        results[p] = future.result()
+                    except Exception:
+                        pass
+            else:
+                for p in todo:
+                    try:
+                        results[p] = read_inventory_export_file(p, item_row, item_col, store_col, fallback_stores)
+                    except Exception:
+                        pass
+            with self._connect() as db:
+                for p in stale + list(results):
+                    db.execute("DELETE FROM counts WHERE path = ?", (p,))
+                    db.execute("DELETE FROM files WHERE path = ?", (p,))
+                for p, result in results.items():
+                    db.execute("INSERT INTO files VALUES (?, ?, ?)", (p, mtimes[p], result["date"]))
+                    db.executemany("INSERT INTO counts VALUES (?, ?, ?, ?, ?)",
+                                   [(p, item, store, result["date"], count) for item, store, count in result["rows"]])
+            return len(results)
+
+    def items(self):
+        with self._connect() as db:
+            return [row[0] for row in db.execute("SELECT DISTINCT item FROM counts ORDER BY item")]
+
+    def weeks(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(DISTINCT date) FROM files").fetchone()[0]
+
+    def query(self, item, store, weeks=52):
+        since = (datetime.today() - timedelta(weeks=weeks)).strftime("%Y-%m-%d")
+        with self._connect() as db:
+            # A week may have been exported more than once (e.g. as .xls and .xlsx); only the
+            # newest file for each date is counted.
+            return list(db.execute(
+                "SELECT c.date, SUM(c.count) FROM counts c JOIN files f ON f.path = c.path "
+                "WHERE c.item = ? AND c.store = ? AND c.date >= ? "
+                "AND f.path = (SELECT f2.path FROM files f2 WHERE f2.date = c.date ORDER BY f2.mtime DESC LIMIT 1) "
+                "GROUP BY c.date ORDER BY c.date", (item, store_key(store), since)))
+
+class FoilForecaster:
+    # Parsed history of exported Foil Pan Order files, cached by path and mtime so only new or
+    # changed files are ever reopened. Forecasts are computed with numpy over the whole
+    # weeks x stores x pans block at once.
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        try:
+            with open(cache_path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        # Held under the lock and swapped in atomically, so the refresh thread and an export on the
+        # Tk thread never interleave their writes.
+        with self.lock:
+            tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.cache_path)
+
+    def refresh(self, folder, store_row, store_col):
+        paths = glob.glob(os.path.join(glob.escape(folder), "Foil Pan Order *.xls"))
+        paths += glob.glob(os.path.join(glob.escape(folder), "Foil Pan Order *.xlsx"))
+        mtimes = {os.path.abspath(p): os.path.getmtime(p) for p in paths}
+        with self.lock:
+            stale = [p for p in self.entries if p not in mtimes]
+            todo = [p for p, m in mtimes.items() if self.entries.get(p, {}).get("mtime") != m]
+        results = {}
+        if len(todo) > 4:
+            with ProcessPoolExecutor() as pool:
+                futures = {p: pool.submit(read_foil_order_file, p, store_row, store_col) for p in todo}
+            for p, future in futures.items():
+                try:
+                    results[p] = future.result()
+                except Exception:
+                    pass
+        else:
+            for p in todo:
+                try:
+                    results[p] = read_foil_order_file(p, store_row, store_col)
+                except Exception:
+                    pass
+        with self.lock:
+            for p in stale:
+                del self.entries[p]
+            for p, entry in results.items():
+                entry["mtime"] = mtimes[p]
+                self.entries[p] = entry
+        if stale or results:
+            self.save()
+        return len(results)
+
+    def add_export(self, path, stores):
+        # The app just wrote this file, so record it without parsing it back.
+        entry = {"date": parse_export_date(path, "Foil Pan Order"), "mtime": os.path.getmtime(path), "stores": {}}
+        for store, foil in stores.items():
+            counts = []
+            for j in range(4):
+                try:
+                    counts.append(float(foil[j]))
+                except (IndexError, TypeError, ValueError):
+                    counts.append(None)
+            entry["stores"][store] = counts
+        with self.lock:
+            self.entries[os.path.abspath(path)] = entry
+        self.save()
+
+    def suggest(self, stores, weeks=FOIL_FORECAST_WEEKS):
+        # Moving average of the last `weeks` orders plus the least-squares trend over the same
+        # window, projected one week ahead. Missing weeks are ignored per store and pan. A date
+        # exported more than once (e.g. as .xls and .xlsx) counts once, from its newest file.
+        with self.lock:
+            newest = {}
+            for entry in self.entries.values():
+                if entry["date"] not in newest or entry["mtime"] > newest[entry["date"]]["mtime"]:
+                    newest[entry["date"]] = entry
+        history = [newest[date] for date in sorted(newest)[-weeks:]]
+        if not history or not stores:
+            return {}
+        block = np.full((len(history), len(stores), 4), np.nan)
+        for w, entry in enumerate(history):
+            for s, store in enumerate(stores):
+                counts = entry["stores"].get(store)
+                if counts:
+                    block[w, s] = [np.nan if c is None else c for c in counts]
+        mask = ~np.isnan(block)
+        n = mask.sum(axis=0)
+        x = np.arange(len(history), dtype=float)[:, None, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            xbar = np.where(mask, x, 0).sum(axis=0) / n
+            ybar = np.nansum(block, axis=0) / n
+            dx = np.where(mask, x - xbar, 0)
+            var = (dx * dx).sum(axis=0)
+            slope = np.where(var > 0, (dx * np.nan_to_num(block - ybar)).sum(axis=0) / var, 0.0)
+            forecast = ybar + slope * (len(history) - xbar)
+        forecast = np.ceil(np.clip(np.nan_to_num(forecast, nan=0.0), 0, None)).astype(int)
+        return {store: [int(v) if n[s, j] else "" for j, v in enumerate(forecast[s])] for s, store in enumerate(stores)}
+
+class DataBundle:
+    # Binary Export Data format:
+    #   magic "JVIB", version (u8), header length (u32 LE), header JSON, then the section bodies.
+    # The header maps each section ("exported", "config", "template", "data/<store>") to
+    # [offset, length, codec] within the body, so one store can be read without touching the rest.
+    # Each section is JSON compressed with zlib or lzma, whichever is smaller.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, header_len = struct.unpack("<4sBI", f.read(9))
+            if magic != BUNDLE_MAGIC or version > BUNDLE_VERSION:
+                raise ValueError("Not a supported data bundle")
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+            self.body_start = 9 + header_len
+        self.sections = self.header["sections"]
+
+    @staticmethod
+    def is_bundle(path):
+        with open(path, 'rb') as f:
+            return f.read(4) == BUNDLE_MAGIC
+
+    @staticmethod
+    def write(path, sections):
+        header = {"sections": {}}
+        bodies = []
+        offset = 0
+        for name, value in sections:
+            raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+            packed, codec = zlib.compress(raw, 9), "zlib"
+            alt = lzma.compress(raw, preset=6)
+            if len(alt) < len(packed):
+                packed, codec = alt, "lzma"
+            header["sections"][name] = [offset, len(packed), codec]
+            bodies.append(packed)
+            offset += len(packed)
+        head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        with open(path, 'wb') as f:
+            f.write(struct.pack("<4sBI", BUNDLE_MAGIC, BUNDLE_VERSION, len(head)))
+            f.write(head)
+            for body in bodies:
+                f.write(body)
+
+    def read(self, name, f=None):
+        offset, length, codec = self.sections[name]
+        if f is None:
+            with open(self.path, 'rb') as fh:
+                return self.read(name, fh)
+        f.seek(self.body_start + offset)
+        packed = f.read(length)
+        raw = lzma.decompress(packed) if codec == "lzma" else zlib.decompress(packed)
+        return json.loads(raw.decode("utf-8"))
+
+    def stores(self):
+        return [name[5:] for name in self.sections if name.startswith("data/")]
+
+    def iter_sections(self):
+        # Same shape as iter_json_bundle: ("data", store, record) or (section, None, value).
+        with open(self.path, 'rb') as f:
+            for name in self.sections:
+                if name.startswith("data/"):
+                    yield "data", name[5:], self.read(name, f)
+                else:
+                    yield name, None, self.read(name, f)
+
+def iter_data_file(path):
+    if DataBundle.is_bundle(path):
+        yield from DataBundle(path).iter_sections()
+    else:
+        with open(path, 'r') as f:
+            yield from iter_json_bundle(f)
+
+class ItemSearchIndex:
+    # Every prefix of every word in the item names maps to the rows containing it, and every
+    # prefix of a store number maps to its columns, so a lookup is a few dict hits and a set
+    # intersection no matter how large the grid is.
+    def __init__(self, item_names, stores):
+        self.prefixes = {}
+        for row, name in enumerate(item_names):
+            for token in self.tokenize(name):
+                for i in range(1, len(token) + 1):
+                    self.prefixes.setdefault(token[:i], set()).add(row)
+        self.store_prefixes = {}
+        for col, store in enumerate(stores):
+            for variant in {str(store), str(store).lstrip("0") or "0"}:
+                for i in range(1, len(variant) + 1):
+                    self.store_prefixes.setdefault(variant[:i], col)
+
+    @staticmethod
+    def tokenize(text):
+        return re.findall(r"#?[0-9a-z]+", str(text).lower())
+
+    def search(self, query):
+        # Words match item names by prefix; "#201" (or a bare store number that matches no
+        # item) picks the store column. Returns (sorted matching rows or None, column or None).
+        rows = None
+        store_col = None
+        for token in self.tokenize(query):
+            if token.startswith("#"):
+                store_col = self.store_prefixes.get(token[1:], store_col)
+                continue
+            hits = self.prefixes.get(token)
+            if hits is None and token.isdigit() and token in self.store_prefixes:
+                # A bare number no item contains selects the store and is left out of the rows.
+                store_col = self.store_prefixes[token] if store_col is None else store_col
+                continue
+            hits = hits or set()
+            rows = hits if rows is None else rows & hits
+        return (sorted(rows) if rows is not None else None), store_col
+
+class XlsExportBackend:
+    # Copies the formatted .xls template with xlutils and writes the plan over it with xlwt.
+    extension = ".xls"
+
+    def __init__(self, template_path, out_path):
+        self.out_path = out_path
+        shutil.copy(template_path, out_path)
+        rb = xlrd.open_workbook(out_path, formatting_info=True)
+        self.wb = xl_copy(rb)
+        self.ws = self.wb.get_sheet(0)
+        self.styles = self._styles()
+
+    def _styles(self):
+        align_center = xlwt.Alignment()
+        align_center.horz = xlwt.Alignment.HORZ_CENTER
+        align_center.vert = xlwt.Alignment.VERT_CENTER
+
+        # Style A2
+        style_a2 = xlwt.XFStyle()
+        font_a2 = xlwt.Font()
+        font_a2.name = 'Arial'
+        font_a2.height = 12 * 20
+        style_a2.font = font_a2
+        style_a2.alignment = align_center
+
+        # Style A5:A34
+        style_a_col = xlwt.XFStyle()
+        font_a = xlwt.Font()
+        font_a.name = 'Times New Roman'
+        font_a.height = 9 * 20
+        style_a_col.font = font_a
+        align_left = xlwt.Alignment()
+        align_left.horz = xlwt.Alignment.HORZ_LEFT
+        align_left.vert = xlwt.Alignment.VERT_CENTER
+        style_a_col.alignment = align_left
+
+        # Style B5:AE34
+        style_b_to_ae = xlwt.XFStyle()
+        font_b = xlwt.Font()
+        font_b.name = 'Arial Narrow'
+        font_b.height = 8 * 20
+        style_b_to_ae.font = font_b
+        style_b_to_ae.alignment = align_center
+        borders = xlwt.Borders()
+        borders.left = borders.right = borders.top = borders.bottom = xlwt.Borders.THIN
+        borders.inner = xlwt.Borders.DOTTED
+        style_b_to_ae.borders = borders
+
+        # Style AF5:AF34
+        style_af = xlwt.XFStyle()
+        font_af = xlwt.Font()
+        font_af.name = 'Arial'
+        font_af.height = 8 * 20
+        style_af.font = font_af
+        style_af.alignment = align_center
+
+        return {"a2": style_a2, "a_col": style_a_col, "b_to_ae": style_b_to_ae, "af": style_af}
+
+    def write(self, plan):
+        for row, col, block, style in plan:
+            args = (self.styles[style],) if style else ()
+            for r, values in enumerate(block, start=row):
+                sheet_row = self.ws.row(r)
+                for c, value in enumerate(values, start=col):
+                    if isinstance(value, ExcelFormula):
+                        value = xlwt.Formula(value)
+                    sheet_row.write(c, value, *args)
+
+    def save(self):
+        self.wb.save(self.out_path)
+
+class XlsxExportBackend:
+    # Streams the plan into a write-only openpyxl workbook, one row at a time. The template's
+    # cell values (headers, labels) are carried over; its formatting is replaced by the plan styles.
+    extension = ".xlsx"
+
+    def __init__(self, template_path, out_path):
+        self.out_path = out_path
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet()
+        if template_path.lower().endswith(".xlsx"):
+            self.template_sheet = XlsxSheetReader(template_path)
+        else:
+            self.template_sheet = xlrd.open_workbook(template_path, on_demand=True).sheet_by_index(0)
+        center = Alignment(horizontal="center", vertical="center")
+        thin = Side(style="thin")
+        self.styles = {
+            "a2": {"font": Font(name="Arial", size=12), "alignment": center},
+            "a_col": {"font": Font(name="Times New Roman", size=9),
+                      "alignment": Alignment(horizontal="left", vertical="center")},
+            "b_to_ae": {"font": Font(name="Arial Narrow", size=8), "alignment": center,
+                        "border": Border(left=thin, right=thin, top=thin, bottom=thin)},
+            "af": {"font": Font(name="Arial", size=8), "alignment": center},
+        }
+
+    def _cell(self, value, style):
+        if isinstance(value, ExcelFormula):
+            value = "=" + value
+        cell = WriteOnlyCell(self.ws, value=None if value == "" else value)
+        for attr, val in self.styles.get(style, {}).items():
+            setattr(cell, attr, val)
+        return cell
+
+    def write(self, plan):
+        # Rows are emitted in order: each row merges the template's values for that row with the
+        # plan blocks that cover it, so only one row of cells exists at a time. Blocks later in
+        # the plan win where they overlap, as with the xls backend.
+        template = self.template_sheet
+        pending = sorted(((i, entry) for i, entry in enumerate(plan) if entry[2]), key=lambda entry: entry[1][0])
+        active = []
+        last_row = max([row + len(block) - 1 for i, (row, col, block, style) in pending] + [template.nrows - 1])
+        for r in range(last_row + 1):
+            while pending and pending[0][1][0] == r:
+                active.append(pending.pop(0))
+            active.sort(key=lambda entry: entry[0])
+            line = [self._cell(value, None) if value != "" else None
+                    for value in (template.row_values(r) if r < template.nrows else [])]
+            for order, (row, col, block, style) in active:
+                values = block[r - row]
+                if len(line) < col + len(values):
+                    line.extend([None] * (col + len(values) - len(line)))
+                for c, value in enumerate(values, start=col):
+                    line[c] = self._cell(value, style)
+            while line and line[-1] is None:
+                line.pop()
+            self.ws.append(line)
+            active = [entry for entry in active if r < entry[1][0] + len(entry[1][2]) - 1]
+
+    def save(self):
+        self.wb.save(self.out_path)
+
+EXPORT_BACKENDS = {"xls": XlsExportBackend, "xlsx": XlsxExportBackend}
+
 class AreaDialog(simpledialog.Dialog):
     def __init__(self, parent, title, fields, initial_values=None):
         self.fields = fields
@@ -43,6 +774,425 @@ class AreaDialog(simpledialog.Dialog):
         for field, entry in self.entries.items():
             self.values[field] = entry.get().strip()
 
+class StoreStatusPanel(ttk.Frame):
+    # Scrollable store grid drawn on a canvas. Only rows inside the viewport have canvas items,
+    # and set_status touches a single store, so updates stay cheap with hundreds of stores.
+    ROW_HEIGHT = 20
+    VISIBLE_ROWS = 14
+
+    def __init__(self, parent, font=("Arial", 10, "bold")):
+        super().__init__(parent)
+        self.font = font
+        self.canvas = tk.Canvas(self, height=self.ROW_HEIGHT * self.VISIBLE_ROWS, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.columns = ()
+        self.positions = {}
+        self.uploaded = {}
+        self.uploaded_count = 0
+        self.items = {}
+        self.n_rows = 0
+        self.canvas.bind("<Configure>", lambda e: self._render(relayout=True))
+        self.canvas.bind("<MouseWheel>", lambda e: self._yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self._yview("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self._yview("scroll", 1, "units"))
+
+    def set_stores(self, columns):
+        self.canvas.delete("all")
+        self.items = {}
+        self.columns = tuple(tuple(col) for col in columns)
+        self.positions = {}
+        for c, stores in enumerate(self.columns):
+            for r, store in enumerate(stores):
+                self.positions[store] = (c, r)
+        self.uploaded = {store: self.uploaded.get(store, False) for store in self.positions}
+        self.uploaded_count = sum(1 for v in self.uploaded.values() if v)
+        self.n_rows = max((len(col) for col in self.columns), default=0)
+        self.canvas.configure(scrollregion=(0, 0, 0, self.n_rows * self.ROW_HEIGHT),
+                              yscrollincrement=self.ROW_HEIGHT)
+        self.canvas.yview_moveto(0)
+        self._render()
+
+    def set_status(self, store, uploaded):
+        if store not in self.positions or self.uploaded[store] == uploaded:
+            return
+        self.uploaded[store] = uploaded
+        self.uploaded_count += 1 if uploaded else -1
+        item = self.items.get(store)
+        if item is not None:
+            text, fg = self._label(store)
+            self.canvas.itemconfigure(item, text=text, fill=fg)
+
+    def _label(self, store):
+        check, cross = "\u2714", "\u2716"
+        try:
+            name = f"{int(store):3}"
+        except ValueError:
+            name = store
+        if self.uploaded.get(store):
+            return f"{name} {check}", "#1ca41c"
+        return f"{name} {cross}", "black"
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self._render()
+
+    def _render(self, relayout=False):
+        if relayout:
+            self.canvas.delete("all")
+            self.items = {}
+        top = int(self.canvas.canvasy(0)) // self.ROW_HEIGHT
+        height = max(self.canvas.winfo_height(), self.ROW_HEIGHT * self.VISIBLE_ROWS)
+        bottom = min(self.n_rows, top + height // self.ROW_HEIGHT + 2)
+        visible = set()
+        for stores in self.columns:
+            visible.update(stores[top:bottom])
+        for store in [s for s in self.items if s not in visible]:
+            self.canvas.delete(self.items.pop(store))
+        col_width = max(self.canvas.winfo_width(), 1) / max(len(self.columns), 1)
+        for store in visible:
+            if store in self.items:
+                continue
+            c, r = self.positions[store]
+            text, fg = self._label(store)
+            self.items[store] = self.canvas.create_text(
+                col_width * c + col_width / 2, r * self.ROW_HEIGHT + self.ROW_HEIGHT / 2,
+                text=text, fill=fg, font=self.font, anchor="center")
+
+class StoreSheetUploadServer:
+    # Minimal HTTP endpoint: POST /upload with the raw .xls file as the request body.
+    # Sheets are parsed on a worker pool; results are handed to on_parsed from the server thread.
+    def __init__(self, parse_contents, on_parsed, host=UPLOAD_SERVER_HOST, port=UPLOAD_SERVER_PORT, workers=4):
+        self.parse_contents = parse_contents
+        self.on_parsed = on_parsed
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        if self.error:
+            raise self.error
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(5)
+        self.executor.shutdown(wait=False)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            parts = request_line.split()
+            if len(parts) < 2 or parts[0] != "POST" or not parts[1].startswith("/upload"):
+                await self._respond(writer, 404, {"error": "POST store sheets to /upload"})
+                return
+            length = int(headers.get("content-length", "0") or 0)
+            if length <= 0 or length > UPLOAD_MAX_BYTES:
+                await self._respond(writer, 413 if length > 0 else 400, {"error": "Invalid Content-Length"})
+                return
+            contents = await reader.readexactly(length)
+            try:
+                store, inventory, foil = await self.loop.run_in_executor(
+                    self.executor, self.parse_contents, contents)
+            except Exception as e:
+                await self._respond(writer, 422, {"error": str(e)})
+                return
+            self.on_parsed(store, inventory, foil)
+            await self._respond(writer, 200, {"store": store, "items": len(inventory)})
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            await self._respond(writer, 400, {"error": str(e)})
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, code, payload):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 422: "Unprocessable Entity"}
+        body = json.dumps(payload).encode("utf-8")
+        head = (f"HTTP/1.1 {code} {reasons.get(code, '')}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n")
+        try:
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+class ShardedDataStore:
+    # One JSON file per store plus a manifest listing them. Shards are replaced atomically;
+    # the manifest is read-modify-written under an advisory lock file so that several
+    # workstations sharing the folder only ever add or remove their own stores. A store is
+    # "ours" once this instance has loaded or written it; stores that appeared later from
+    # other workstations are never removed by a full save.
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.manifest_path = os.path.join(root_dir, SHARD_MANIFEST)
+        self.lock_path = os.path.join(root_dir, SHARD_LOCK)
+        self.known = set()
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def shard_name(self, store):
+        # Every write gets a new file name, recorded in the manifest entry, so a writer never
+        # overwrites a shard that another workstation's manifest entry still points at.
+        stamp = f"{socket.gethostname()}-{os.getpid()}-{time.time_ns()}"
+        return "store_" + re.sub(r"[^0-9A-Za-z_-]", "_", f"{store}_{stamp}") + ".json"
+
+    def _break_stale_lock(self):
+        # Move the lock aside under a unique name before deleting it, then check that what was
+        # moved is the stale lock that was seen and not a fresh one another waiter just took.
+        try:
+            seen = os.stat(self.lock_path)
+        except OSError:
+            return
+        if time.time() - seen.st_mtime <= SHARD_LOCK_STALE:
+            return
+        aside = f"{self.lock_path}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.stale"
+        try:
+            os.rename(self.lock_path, aside)
+        except OSError:
+            return
+        moved = os.stat(aside)
+        if (moved.st_ino, moved.st_mtime) != (seen.st_ino, seen.st_mtime) or \
+                time.time() - moved.st_mtime <= SHARD_LOCK_STALE:
+            try:
+                os.link(aside, self.lock_path)
+            except OSError:
+                pass
+        try:
+            os.remove(aside)
+        except OSError:
+            pass
+
+    @contextmanager
+    def locked(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+        deadline = time.time() + SHARD_LOCK_TIMEOUT
+        token = f"{socket.gethostname()} {os.getpid()} {threading.get_ident()} {time.time()}"
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                self._break_stale_lock()
+                if time.time() > deadline:
+                    raise TimeoutError(f"Data folder is locked by another workstation ({self.lock_path})")
+                time.sleep(0.05)
+        try:
+            os.write(fd, token.encode("utf-8"))
+            os.close(fd)
+            yield
+        finally:
+            # Only remove the lock if it is still ours.
+            try:
+                with open(self.lock_path, 'r') as f:
+                    ours = f.read() == token
+                if ours:
+                    os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def _write_json(self, path, obj):
+        tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(obj, f)
+        for attempt in range(10):
+            try:
+                os.replace(tmp, path)
+                return
+            except PermissionError:
+                # Windows refuses to replace a file another process has open; retry briefly.
+                if attempt == 9:
+                    raise
+                time.sleep(0.05)
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        manifest.setdefault("stores", {})
+        return manifest
+
+    def _read_shard(self, name):
+        try:
+            with open(os.path.join(self.root_dir, name), 'r') as f:
+                shard = json.load(f)
+            return shard["store"], shard["data"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def load(self):
+        entries = self.read_manifest()["stores"]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            shards = dict(zip(entries, pool.map(self._read_shard, [entry["file"] for entry in entries.values()])))
+        missing = [store for store, shard in shards.items() if not shard]
+        if missing:
+            # A writer may have replaced a shard between reading the manifest and the file;
+            # re-read the manifest once and follow the new file names.
+            entries = self.read_manifest()["stores"]
+            for store in missing:
+                if store in entries:
+                    shards[store] = self._read_shard(entries[store]["file"])
+        data = dict(shard for shard in shards.values() if shard)
+        self.known = set(data)
+        return data
+
+    def _remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.root_dir, name))
+            except OSError:
+                pass
+
+    def save(self, data, stores=None):
+        # stores: the stores to write or, when missing from data, remove. stores=None writes all
+        # of data and removes only stores this instance knew about that are no longer in data.
+        # Shards are written under fresh names first; old files are only deleted under the lock,
+        # and only the ones the manifest entries being replaced or removed referenced.
+        os.makedirs(self.root_dir, exist_ok=True)
+        names = list(data) if stores is None else list(stores)
+        written = {}
+        try:
+            for store in names:
+                if store in data:
+                    name = self.shard_name(store)
+                    self._write_json(os.path.join(self.root_dir, name), {"store": store, "data": data[store]})
+                    written[store] = {"file": name, "updated": datetime.now().isoformat(timespec="seconds"),
+                                      "host": socket.gethostname()}
+            with self.locked():
+                manifest = self.read_manifest()
+                entries = manifest["stores"]
+                candidates = self.known if stores is None else stores
+                removed = [s for s in entries if s not in data and s in candidates]
+                old_files = [entries.pop(store)["file"] for store in removed]
+                old_files += [entries[store]["file"] for store in written if store in entries]
+                entries.update(written)
+                self._write_json(self.manifest_path, manifest)
+                live = {entry["file"] for entry in entries.values()}
+                self._remove_files(name for name in old_files if name not in live)
+        except BaseException:
+            self._remove_files(entry["file"] for entry in written.values())
+            raise
+        self.known.update(written)
+        self.known.difference_update(removed)
+
+class SnapshotStore:
+    # Content-addressed version history. Each store record, the template and the config are
+    # stored once under their hash in objects/; a version is just a map of store -> hash, so
+    # versions share every record that did not change between them.
+    def __init__(self, root_dir, limit=SNAPSHOT_LIMIT):
+        self.root_dir = root_dir
+        self.objects_dir = os.path.join(root_dir, "objects")
+        self.index_path = os.path.join(root_dir, "versions.json")
+        self.limit = limit
+        self.versions = []
+        self.known = set()
+        self.cache = {}
+        try:
+            with open(self.index_path, 'r') as f:
+                self.versions = json.load(f)
+            self.known = {name[:-5] for name in os.listdir(self.objects_dir) if name.endswith(".json")}
+        except (OSError, ValueError):
+            self.versions = []
+
+    def _put(self, obj):
+        text = json.dumps(obj, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if digest not in self.known:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            with open(os.path.join(self.objects_dir, digest + ".json"), 'w') as f:
+                f.write(text)
+            self.known.add(digest)
+        return digest
+
+    def _get(self, digest):
+        if digest not in self.cache:
+            with open(os.path.join(self.objects_dir, digest + ".json"), 'r') as f:
+                self.cache[digest] = f.read()
+        return json.loads(self.cache[digest])
+
+    def snapshot(self, label, data, template, config):
+        version = {
+            "id": (self.versions[-1]["id"] + 1) if self.versions else 1,
+            "label": label,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "stores": {store: self._put(record) for store, record in data.items()},
+            "template": self._put(template),
+            "config": self._put(config)
+        }
+        if self.versions and all(self.versions[-1][k] == version[k] for k in ("stores", "template", "config")):
+            return None
+        self.versions.append(version)
+        self._prune()
+        return version
+
+    def restore(self, version):
+        data = {store: self._get(digest) for store, digest in version["stores"].items()}
+        return data, self._get(version["template"]), self._get(version["config"])
+
+    def pop(self):
+        version = self.versions.pop()
+        self._prune()
+        return version
+
+    def _prune(self):
+        del self.versions[:-self.limit]
+        live = set()
+        for version in self.versions:
+            live.update(version["stores"].values())
+            live.update((version["template"], version["config"]))
+        for digest in self.known - live:
+            try:
+                os.remove(os.path.join(self.objects_dir, digest + ".json"))
+            except OSError:
+                pass
+            self.cache.pop(digest, None)
+        self.known &= live
+        os.makedirs(self.root_dir, exist_ok=True)
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.versions, f)
+        os.replace(tmp, self.index_path)
+
 class InventoryApp:
     def __init__(self, root):
         self.root = root
@@ -55,67 +1205,52 @@ class InventoryApp:
             "inventory_template": "",
             "foil_template": "",
             "total_export_template": "",
+            "upload_server_port": UPLOAD_SERVER_PORT,
+            "data_storage": "single",
+            "snapshot_limit": SNAPSHOT_LIMIT,
+            "export_format": "xls",
             "store_col1": DEFAULT_STORE_COL1,
             "store_col2": DEFAULT_STORE_COL2,
-            "import_template_areas": {
-                "date_cell": "C4",
-                "pack_range": "A8:A44",
-                "size_range": "B8:B44",
-                "desc_range": "C8:C44"
-            },
-            "store_sheet_areas": {
-                "store_cell": "G3",
-                "inventory_range": "D8:D44",
-                "foil_range": "G8:G11"
-            },
-            "export_inventory_areas": {
-                "date_cell": "A2",
-                "item_start_cell": "A5",
-                "store_col_start": "B5"
-            },
-            "export_foil_areas": {
-                "date_cell": "A2",
-                "store_start_cell": "B5"
-            }
+            **{group: dict(areas) for group, areas in AREA_DEFAULTS.items()}
         }
         self.template = {}
+        self.upload_server = None
+        self.upload_queue = queue.Queue()
+        self.shard_store = None
         self.load_config()
+        self.compile_areas()
         self.load_data()
+        # The working folder may be shared between workstations; each keeps its own undo history.
+        snapshot_dir = os.path.join(SNAPSHOT_DIR, re.sub(r"[^0-9A-Za-z_-]", "_", socket.gethostname()))
+        self.snapshots = SnapshotStore(snapshot_dir, self.config.get("snapshot_limit", SNAPSHOT_LIMIT))
+        self.foil_forecaster = FoilForecaster(FOIL_HISTORY_CACHE)
+        self.inventory_index = InventoryHistoryIndex(INVENTORY_INDEX_DB)
+        self.index_thread = None
         self.build_gui()
+        if self.area_plan.errors:
+            self.status.config(text="Invalid areas in config, using defaults for: " + "; ".join(self.area_plan.errors))
+        self.start_inventory_indexer()
 
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
             try:
                 with open(CONFIG_FILE, 'r') as f:
                     self.config = json.load(f)
+                if "upload_server_port" not in self.config:
+                    self.config["upload_server_port"] = UPLOAD_SERVER_PORT
+                if "data_storage" not in self.config:
+                    self.config["data_storage"] = "single"
+                if "snapshot_limit" not in self.config:
+                    self.config["snapshot_limit"] = SNAPSHOT_LIMIT
+                if "export_format" not in self.config:
+                    self.config["export_format"] = "xls"
                 if "store_col1" not in self.config:
                     self.config["store_col1"] = DEFAULT_STORE_COL1
                 if "store_col2" not in self.config:
                     self.config["store_col2"] = DEFAULT_STORE_COL2
-                if "import_template_areas" not in self.config:
-                    self.config["import_template_areas"] = {
-                        "date_cell": "C4",
-                        "pack_range": "A8:A44",
-                        "size_range": "B8:B44",
-                        "desc_range": "C8:C44"
-                    }
-                if "store_sheet_areas" not in self.config:
-                    self.config["store_sheet_areas"] = {
-                        "store_cell": "G3",
-                        "inventory_range": "D8:D44",
-                        "foil_range": "G8:G11"
-                    }
-                if "export_inventory_areas" not in self.config:
-                    self.config["export_inventory_areas"] = {
-                        "date_cell": "A2",
-                        "item_start_cell": "A5",
-                        "store_col_start": "B5"
-                    }
-                if "export_foil_areas" not in self.config:
-                    self.config["export_foil_areas"] = {
-                        "date_cell": "A2",
-                        "store_start_cell": "B5"
-                    }
+                for group, areas in AREA_DEFAULTS.items():
+                    if group not in self.config:
+                        self.config[group] = dict(areas)
             except Exception:
                 self._set_default_config()
         else:
@@ -129,35 +1264,34 @@ class InventoryApp:
             "inventory_template": "",
             "foil_template": "",
             "total_export_template": "",
+            "upload_server_port": UPLOAD_SERVER_PORT,
+            "data_storage": "single",
+            "snapshot_limit": SNAPSHOT_LIMIT,
+            "export_format": "xls",
             "store_col1": DEFAULT_STORE_COL1,
             "store_col2": DEFAULT_STORE_COL2,
-            "import_template_areas": {
-                "date_cell": "C4",
-                "pack_range": "A8:A44",
-                "size_range": "B8:B44",
-                "desc_range": "C8:C44"
-            },
-            "store_sheet_areas": {
-                "store_cell": "G3",
-                "inventory_range": "D8:D44",
-                "foil_range": "G8:G11"
-            },
-            "export_inventory_areas": {
-                "date_cell": "A2",
-                "item_start_cell": "A5",
-                "store_col_start": "B5"
-            },
-            "export_foil_areas": {
-                "date_cell": "A2",
-                "store_start_cell": "B5"
-            }
+            **{group: dict(areas) for group, areas in AREA_DEFAULTS.items()}
         }
 
     def save_config(self):
         with open(CONFIG_FILE, 'w') as f:
             json.dump(self.config, f, indent=2)
 
+    def sharded_storage(self):
+        if self.config.get("data_storage") != "sharded":
+            return None
+        if self.shard_store is None:
+            self.shard_store = ShardedDataStore(SHARD_DIR)
+        return self.shard_store
+
     def load_data(self):
+        shards = self.sharded_storage()
+        if shards:
+            try:
+                self.data = shards.load()
+            except Exception:
+                self.data = {}
+            return
         if os.path.exists(DATA_FILE):
             try:
                 with open(DATA_FILE, 'r') as f:
@@ -165,20 +1299,90 @@ class InventoryApp:
             except Exception:
                 self.data = {}
 
-    def save_data(self):
+    def save_data(self, stores=None):
+        # stores: only these stores changed (sharded mode writes just their files).
+        shards = self.sharded_storage()
+        if shards:
+            try:
+                shards.save(self.data, stores)
+            except TimeoutError as e:
+                messagebox.showerror("Save Error", str(e))
+            return
         with open(DATA_FILE, 'w') as f:
             json.dump(self.data, f, indent=2)
 
+    def toggle_sharded_storage(self):
+        if self.sharded_var.get():
+            shards = ShardedDataStore(SHARD_DIR)
+            existing = shards.load() if shards.exists() else {}
+            conflicts = sorted(s for s in self.data if s in existing and
+                               json.dumps(self.data[s], sort_keys=True) != json.dumps(existing[s], sort_keys=True))
+            keep_local = False
+            if conflicts:
+                keep_local = messagebox.askyesnocancel(
+                    "Shared Data",
+                    f"'{SHARD_DIR}' already has different data for {len(conflicts)} store(s): "
+                    f"{', '.join(conflicts[:10])}{'...' if len(conflicts) > 10 else ''}.\n\n"
+                    "Yes: keep this workstation's records and write them to the shared folder.\n"
+                    "No: use the shared records (this workstation's are kept in a snapshot).\n"
+                    "Cancel: keep using the single data file.")
+                if keep_local is None:
+                    self.sharded_var.set(False)
+                    return
+            self.take_snapshot("Before switching to per-store files")
+            if not keep_local:
+                conflicts = []
+            new_stores = [s for s in self.data if s not in existing or s in conflicts]
+            self.data.update({s: record for s, record in existing.items() if s not in conflicts})
+            self.config["data_storage"] = "sharded"
+            self.shard_store = shards
+            self.save_data(new_stores)
+            self.status.config(text=f"Using per-store data files in '{SHARD_DIR}' ({len(self.data)} stores).")
+        else:
+            self.config["data_storage"] = "single"
+            self.save_data()
+            self.status.config(text=f"Using single data file '{DATA_FILE}'.")
+        self.save_config()
+        self.update_store_status_display()
+
+    def reload_data(self):
+        self.load_data()
+        self.fix_data_store_keys()
+        self.update_store_status_display()
+        self.status.config(text=f"Data reloaded: {len(self.data)} stores.")
+
     def fix_data_store_keys(self):
         new_data = {}
         for k, v in self.data.items():
-            try:
-                newk = f"{int(float(k)):03}"
-            except:
-                newk = str(k).zfill(3)
-            new_data[newk] = v
+            new_data[store_key(k)] = v
         self.data = new_data
 
+    def make_store_record(self, inventory, foil):
+        record = {"inventory": inventory, "foil": foil, "updated": datetime.now().isoformat(timespec="seconds")}
+        keys = self.template_item_keys()
+        if keys:
+            record["items"] = self.keyed_items(inventory, keys)
+        return record
+
+    def template_item_keys(self, template=None):
+        template = self.template if template is None else template
+        return template_keys(template.get("items", []))
+
+    def keyed_items(self, inventory, keys):
+        # Blank template rows have the empty key and carry no count, so they are skipped.
+        return {key: inventory[idx] for idx, key in enumerate(keys) if key and idx < len(inventory)}
+
+    def store_inventory(self, store, keys=None):
+        # Counts for the current template's rows: joined by item key when the record has one,
+        # by position for records imported before a template was loaded.
+        keys = self.template_item_keys() if keys is None else keys
+        record = self.data.get(store, {})
+        items = record.get("items")
+        if items is None:
+            inv = record.get("inventory", [])
+            return [inv[idx] if idx < len(inv) else "" for idx in range(len(keys))]
+        return [items.get(key, "") for key in keys]
+
     def get_all_stores(self):
         return self.config.get("store_col1", []) + self.config.get("store_col2", [])
 
@@ -193,6 +1397,8 @@ class InventoryApp:
         store_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Stores", menu=store_menu)
         store_menu.add_command(label="Open Table Editor", command=self.open_table_editor)
+        store_menu.add_command(label="Foil Pan Forecast", command=self.open_foil_forecast)
+        store_menu.add_command(label="Item History", command=self.open_item_history)
         store_menu.add_separator()
         store_menu.add_command(label="Manage Store Numbers", command=self.manage_stores)
 
@@ -215,10 +1421,30 @@ class InventoryApp:
         settings_menu.add_command(label="Set This Week's Inventory Template", command=self.set_inventory_template_path)
         settings_menu.add_command(label="Set Foil Pan Template", command=self.set_foil_template_path)
         settings_menu.add_command(label="Set Final Inventory Template", command=self.set_total_export_template_path)
+        format_menu = tk.Menu(settings_menu, tearoff=0)
+        settings_menu.add_cascade(label="Export File Format", menu=format_menu)
+        self.export_format_var = tk.StringVar(value=self.config.get("export_format", "xls"))
+        format_menu.add_radiobutton(label="Excel 97-2003 (.xls)", value="xls", variable=self.export_format_var,
+                                    command=self.set_export_format)
+        format_menu.add_radiobutton(label="Excel Workbook (.xlsx)", value="xlsx", variable=self.export_format_var,
+                                    command=self.set_export_format)
+        settings_menu.add_separator()
+        settings_menu.add_command(label="Set Upload Server Port", command=self.set_upload_server_port)
+        settings_menu.add_command(label="Start Upload Server", command=self.start_upload_server)
+        settings_menu.add_command(label="Stop Upload Server", command=self.stop_upload_server)
 
         # Data menu for clear/reset function
         data_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Data", menu=data_menu)
+        data_menu.add_command(label="Merge Data Files", command=self.merge_json_data)
+        data_menu.add_command(label="Reload Data", command=self.reload_data)
+        self.sharded_var = tk.BooleanVar(value=self.config.get("data_storage") == "sharded")
+        data_menu.add_checkbutton(label="Use Per-Store Data Files", variable=self.sharded_var,
+                                  command=self.toggle_sharded_storage)
+        data_menu.add_separator()
+        data_menu.add_command(label="Undo Last Change", command=self.undo_last_change)
+        data_menu.add_command(label="Restore Snapshot", command=self.restore_snapshot_dialog)
+        data_menu.add_separator()
         data_menu.add_command(label="Clear All Data", command=self.clear_all_data)
 
         # Main buttons row
@@ -239,24 +1465,10 @@ class InventoryApp:
 
         # Store status display
         store_status_frame = ttk.LabelFrame(frame, text="Store Upload Status")
-        store_status_frame.grid(row=2, column=0, columnspan=5, pady=10, sticky="we")
-        for col in range(2):
-            store_status_frame.grid_columnconfigure(col, weight=1)
-
-        self.store_labels_col1 = []
-        self.store_labels_col2 = []
-
-        label_font = ("Arial", 10, "bold")
-
-        for row, store in enumerate(self.config["store_col1"]):
-            lbl = tk.Label(store_status_frame, text="", anchor='center', width=8, font=label_font, justify='center')
-            lbl.grid(row=row, column=0, sticky="we", padx=2, pady=1)
-            self.store_labels_col1.append(lbl)
-
-        for row, store in enumerate(self.config["store_col2"]):
-            lbl = tk.Label(store_status_frame, text="", anchor='center', width=8, font=label_font, justify='center')
-            lbl.grid(row=row, column=1, sticky="we", padx=2, pady=1)
-            self.store_labels_col2.append(lbl)
+        store_status_frame.grid(row=2, column=0, columnspan=5, pady=10, sticky="nsew")
+        frame.grid_rowconfigure(2, weight=1)
+        self.store_panel = StoreStatusPanel(store_status_frame)
+        self.store_panel.pack(fill="both", expand=True, padx=2, pady=1)
 
         # Progress bar for imported stores
         imported_frame = ttk.LabelFrame(frame, text="Imported Stores Progress")
@@ -282,35 +1494,22 @@ class InventoryApp:
         y = (screen_height // 2) - (preferred_height // 2)
         self.root.geometry(f"+{x}+{y}")
 
-    def update_store_status_display(self):
-        check, cross = "\u2714", "\u2716"
-        stores1 = self.config.get("store_col1", [])
-        stores2 = self.config.get("store_col2", [])
-        for i, store in enumerate(stores1):
-            uploaded = store in self.data
-            if i < len(self.store_labels_col1):
-                if uploaded:
-                    self.store_labels_col1[i]['text'] = f"{int(store):3} {check}"
-                    self.store_labels_col1[i]['fg'] = "#1ca41c"
-                else:
-                    self.store_labels_col1[i]['text'] = f"{int(store):3} {cross}"
-                    self.store_labels_col1[i]['fg'] = "black"
-        for i, store in enumerate(stores2):
-            uploaded = store in self.data
-            if i < len(self.store_labels_col2):
-                if uploaded:
-                    self.store_labels_col2[i]['text'] = f"{int(store):3} {check}"
-                    self.store_labels_col2[i]['fg'] = "#1ca41c"
-                else:
-                    self.store_labels_col2[i]['text'] = f"{int(store):3} {cross}"
-                    self.store_labels_col2[i]['fg'] = "black"
+    def update_store_status_display(self, stores=None):
+        # stores: the stores whose data changed; None re-checks every store but only
+        # redraws the ones whose status actually flipped.
+        columns = (tuple(self.config.get("store_col1", [])), tuple(self.config.get("store_col2", [])))
+        if columns != self.store_panel.columns:
+            self.store_panel.set_stores(columns)
+            stores = None
+        if stores is None:
+            stores = self.store_panel.positions
+        for store in stores:
+            self.store_panel.set_status(store, store in self.data)
         self.update_imported_stores_progress()
 
     def update_imported_stores_progress(self):
-        total_stores = len(self.get_all_stores())
-        imported = len([s for s in self.get_all_stores() if s in self.data])
-        self.imported_progress["maximum"] = total_stores
-        self.imported_progress["value"] = imported
+        self.imported_progress["maximum"] = len(self.store_panel.positions)
+        self.imported_progress["value"] = self.store_panel.uploaded_count
 
     # Settings menu methods
     def set_download_path(self):
@@ -349,57 +1548,51 @@ class InventoryApp:
             self.config["total_export_template"] = path
             self.save_config()
 
+    def set_export_format(self):
+        self.config["export_format"] = self.export_format_var.get()
+        self.save_config()
+
     # Area dialog menu methods
+    def _save_areas(self, group, values):
+        errors = AreaPlan.validate(values)
+        if errors:
+            messagebox.showerror("Invalid Area", "These areas were not saved:\n" + "\n".join(errors))
+            return
+        self.config[group] = values
+        self.compile_areas()
+        self.save_config()
+
     def set_import_template_areas(self):
         fields = ["date_cell", "pack_range", "size_range", "desc_range"]
         initial = self.config.get("import_template_areas", {})
         dlg = AreaDialog(self.root, "Set Template Import Areas", fields, initial)
         if dlg.values:
-            self.config["import_template_areas"] = dlg.values
-            self.save_config()
+            self._save_areas("import_template_areas", dlg.values)
 
     def set_store_sheet_areas(self):
         fields = ["store_cell", "inventory_range", "foil_range"]
         initial = self.config.get("store_sheet_areas", {})
         dlg = AreaDialog(self.root, "Set Store Sheet Import Areas", fields, initial)
         if dlg.values:
-            self.config["store_sheet_areas"] = dlg.values
-            self.save_config()
+            self._save_areas("store_sheet_areas", dlg.values)
 
     def set_export_inventory_areas(self):
         fields = ["date_cell", "item_start_cell", "store_col_start"]
         initial = self.config.get("export_inventory_areas", {})
         dlg = AreaDialog(self.root, "Set Inventory Export Areas", fields, initial)
         if dlg.values:
-            self.config["export_inventory_areas"] = dlg.values
-            self.save_config()
+            self._save_areas("export_inventory_areas", dlg.values)
 
     def set_export_foil_areas(self):
         fields = ["date_cell", "store_start_cell"]
         initial = self.config.get("export_foil_areas", {})
         dlg = AreaDialog(self.root, "Set Foil Pan Export Areas", fields, initial)
         if dlg.values:
-            self.config["export_foil_areas"] = dlg.values
-            self.save_config()
+            self._save_areas("export_foil_areas", dlg.values)
 
-    def parse_cell(self, ref):
-        ref = ref.strip().upper()
-        for i, c in enumerate(ref):
-            if c.isdigit():
-                break
-        col = ref[:i]
-        row = ref[i:]
-        return int(row)-1, colname2idx(col)
-
-    def parse_range(self, ref):
-        if ":" in ref:
-            a, b = ref.split(":")
-            r1, c1 = self.parse_cell(a)
-            r2, c2 = self.parse_cell(b)
-            return r1, c1, r2, c2
-        else:
-            r, c = self.parse_cell(ref)
-            return r, c, r, c
+    def compile_areas(self):
+        self.area_plan = AreaPlan(self.config)
+        return self.area_plan.errors
 
     def import_template(self):
         path = self.config.get("inventory_template")
@@ -412,70 +1605,79 @@ class InventoryApp:
         try:
             book = xlrd.open_workbook(path)
             sheet = book.sheet_by_index(0)
-            areas = self.config.get("import_template_areas", {})
+            plan = self.area_plan
             date_val = ""
             try:
-                row, col = self.parse_cell(areas.get("date_cell", "C4"))
+                row, col = plan.cell("import_template_areas", "date_cell")
                 date_val = str(sheet.cell_value(row, col)).strip()
             except Exception:
                 pass
             self.template["date"] = date_val
-            pack_r1, pack_c1, pack_r2, pack_c2 = self.parse_range(areas.get("pack_range", "A8:A44"))
-            size_r1, size_c1, size_r2, size_c2 = self.parse_range(areas.get("size_range", "B8:B44"))
-            desc_r1, desc_c1, desc_r2, desc_c2 = self.parse_range(areas.get("desc_range", "C8:C44"))
-            n_items = max(pack_r2-pack_r1+1, size_r2-size_r1+1, desc_r2-desc_r1+1)
+            packs = plan.area("import_template_areas", "pack_range").values(sheet)
+            sizes = plan.area("import_template_areas", "size_range").values(sheet)
+            descs = plan.area("import_template_areas", "desc_range").values(sheet)
+            n_items = max(len(packs), len(sizes), len(descs))
             items = []
             item_names = []
             for i in range(n_items):
-                try: pack = str(sheet.cell_value(pack_r1+i, pack_c1)).strip()
-                except Exception: pack = ""
-                try: size = str(sheet.cell_value(size_r1+i, size_c1)).strip()
-                except Exception: size = ""
-                try: desc = str(sheet.cell_value(desc_r1+i, desc_c1)).strip()
-                except Exception: desc = ""
+                pack = str(packs[i]).strip() if i < len(packs) else ""
+                size = str(sizes[i]).strip() if i < len(sizes) else ""
+                desc = str(descs[i]).strip() if i < len(descs) else ""
                 items.append({'case_qty': pack, 'size': size, 'description': desc})
                 display_name = f"{desc}, {size}, {pack}".strip(", ")
                 item_names.append(display_name)
+            # Records that were matched by position to the previous template get their item keys now,
+            # so they keep lining up with the right items after rows are added or reordered.
+            old_keys = self.template_item_keys()
+            keyed = []
+            if old_keys:
+                for store, record in self.data.items():
+                    if "items" not in record:
+                        record["items"] = self.keyed_items(record.get("inventory", []), old_keys)
+                        keyed.append(store)
             self.template["items"] = items
             self.template["item_names"] = item_names
             self.template["template_path"] = path
+            if keyed:
+                self.save_data(keyed)
             self.status.config(text=f"Template imported: {os.path.basename(path)}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to import template: {e}")
 
+    def _read_store_sheet(self, book):
+        plan = self.area_plan
+        sheet = book.sheet_by_index(0)
+        store_row, store_col = plan.cell("store_sheet_areas", "store_cell")
+        store_cell = sheet.cell_value(store_row, store_col)
+        if isinstance(store_cell, float):
+            store = f"{int(store_cell):03}"
+        else:
+            store = str(store_cell).zfill(3)
+        inventory = plan.area("store_sheet_areas", "inventory_range").values(sheet)
+        foil = plan.area("store_sheet_areas", "foil_range").values(sheet)
+        return store, inventory, foil
+
     def load_excel_file(self, path):
         ext = os.path.splitext(path)[1].lower()
-        areas = self.config.get("store_sheet_areas", {})
         try:
             if ext == ".xls":
                 book = xlrd.open_workbook(path)
-                sheet = book.sheet_by_index(0)
-                store_row, store_col = self.parse_cell(areas.get("store_cell", "G3"))
-                store_cell = sheet.cell_value(store_row, store_col)
-                if isinstance(store_cell, float):
-                    store = f"{int(store_cell):03}"
-                else:
-                    store = str(store_cell).zfill(3)
-                ir1, ic1, ir2, ic2 = self.parse_range(areas.get("inventory_range", "D8:D44"))
-                inventory = []
-                for i in range(ir2-ir1+1):
-                    try:
-                        inventory.append(sheet.cell_value(ir1+i, ic1))
-                    except Exception:
-                        inventory.append("")
-                fr1, fc1, fr2, fc2 = self.parse_range(areas.get("foil_range", "G8:G11"))
-                foil = []
-                for i in range(fr2-fr1+1):
-                    try:
-                        foil.append(sheet.cell_value(fr1+i, fc1))
-                    except Exception:
-                        foil.append("")
+                store, inventory, foil = self._read_store_sheet(book)
             else:
                 raise ValueError("Unsupported file format. Only .xls files are supported.")
             return store, inventory, foil
         except Exception as e:
             raise Exception(f"Import error: {e}")
 
+    def parse_store_sheet_contents(self, contents):
+        # Runs on the upload server's worker pool; the workbook never touches disk.
+        try:
+            book = xlrd.open_workbook(file_contents=contents)
+            store, inventory, foil = self._read_store_sheet(book)
+            return f"{int(float(store)):03}", inventory, foil
+        except Exception as e:
+            raise Exception(f"Import error: {e}")
+
     def import_store_sheet(self):
         paths = filedialog.askopenfilenames(
             initialdir=self.config.get("download_path", ""),
@@ -485,51 +1687,122 @@ class InventoryApp:
         if not paths:
             return
 
+        self.take_snapshot("Before store sheet import")
         imported_stores = []
         for path in paths:
             try:
                 store, inventory, foil = self.load_excel_file(path)
                 store = f"{int(float(store)):03}"
-                self.data[store] = {"inventory": inventory, "foil": foil}
+                self.data[store] = self.make_store_record(inventory, foil)
                 imported_stores.append(store)
             except Exception as e:
                 messagebox.showerror("Import Error", f"Failed to read file '{os.path.basename(path)}': {e}")
 
         if imported_stores:
-            self.save_data()
+            self.save_data(imported_stores)
             self.fix_data_store_keys()
-            self.update_store_status_display()
+            self.update_store_status_display(imported_stores)
             self.status.config(text=f"Imported stores: {', '.join(imported_stores)}")
 
+    def set_upload_server_port(self):
+        port = simpledialog.askinteger("Upload Server Port", "Port for the local upload server:",
+                                       initialvalue=self.config.get("upload_server_port", UPLOAD_SERVER_PORT),
+                                       minvalue=1024, maxvalue=65535, parent=self.root)
+        if port:
+            self.config["upload_server_port"] = port
+            self.save_config()
+
+    def start_upload_server(self):
+        if self.upload_server:
+            self.status.config(text=f"Upload server already running on port {self.upload_server.port}.")
+            return
+        port = self.config.get("upload_server_port", UPLOAD_SERVER_PORT)
+        server = StoreSheetUploadServer(self.parse_store_sheet_contents, self._queue_uploaded_sheet, port=port)
+        try:
+            server.start()
+        except Exception as e:
+            server.stop()
+            messagebox.showerror("Upload Server Error", f"Failed to start upload server: {e}")
+            return
+        self.upload_server = server
+        self.root.after(250, self.process_uploaded_sheets)
+        self.status.config(text=f"Upload server listening on http://{UPLOAD_SERVER_HOST}:{port}/upload")
+
+    def stop_upload_server(self):
+        if self.upload_server:
+            self.upload_server.stop()
+            self.upload_server = None
+            self.process_uploaded_sheets()
+            self.status.config(text="Upload server stopped.")
+
+    def _queue_uploaded_sheet(self, store, inventory, foil):
+        # Called from the server thread; Tk and self.data are only touched on the main loop.
+        self.upload_queue.put((store, inventory, foil))
+
+    def process_uploaded_sheets(self):
+        imported_stores = []
+        while True:
+            try:
+                store, inventory, foil = self.upload_queue.get_nowait()
+            except queue.Empty:
+                break
+            if not imported_stores:
+                self.take_snapshot("Before uploaded store sheets")
+            self.data[store] = self.make_store_record(inventory, foil)
+            imported_stores.append(store)
+        if imported_stores:
+            self.save_data(imported_stores)
+            self.update_store_status_display(imported_stores)
+            self.status.config(text=f"Received stores: {', '.join(imported_stores)}")
+        if self.upload_server:
+            self.root.after(250, self.process_uploaded_sheets)
+
     def export_json_data(self):
         export_path = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON Files", "*.json")],
+            filetypes=[("JSON Files", "*.json"), ("Compressed Data Bundle", "*.jvib")],
             initialfile="inventory_data_export.json"
         )
         if export_path:
             try:
-                with open(export_path, 'w') as f:
-                    json.dump({
-                        "data": self.data,
-                        "config": self.config,
-                        "template": self.template
-                    }, f, indent=2)
+                exported = datetime.now().isoformat(timespec="seconds")
+                if export_path.lower().endswith(".jvib"):
+                    sections = [("exported", exported), ("config", self.config), ("template", self.template)]
+                    sections += [(f"data/{store}", record) for store, record in self.data.items()]
+                    DataBundle.write(export_path, sections)
+                else:
+                    with open(export_path, 'w') as f:
+                        json.dump({
+                            "exported": exported,
+                            "data": self.data,
+                            "config": self.config,
+                            "template": self.template
+                        }, f, indent=2)
                 self.status.config(text=f"Data exported to {export_path}")
             except Exception as e:
                 messagebox.showerror("Export Error", f"Failed to export data: {e}")
 
     def import_json_data(self):
         import_path = filedialog.askopenfilename(
-            filetypes=[("JSON Files", "*.json")]
+            filetypes=[("Data Files", "*.json *.jvib"), ("JSON Files", "*.json"), ("Compressed Data Bundle", "*.jvib")]
         )
         if import_path:
             try:
-                with open(import_path, 'r') as f:
-                    imported = json.load(f)
+                if DataBundle.is_bundle(import_path):
+                    imported = {"data": {}}
+                    for section, store, value in DataBundle(import_path).iter_sections():
+                        if section == "data":
+                            imported["data"][store] = value
+                        else:
+                            imported[section] = value
+                else:
+                    with open(import_path, 'r') as f:
+                        imported = json.load(f)
+                self.take_snapshot(f"Before import of {os.path.basename(import_path)}")
                 self.data = imported.get("data", {})
                 self.fix_data_store_keys()
                 self.config = imported.get("config", self.config)
+                self.compile_areas()
                 self.template = imported.get("template", {})
                 self.save_data()
                 self.save_config()
@@ -538,29 +1811,92 @@ class InventoryApp:
             except Exception as e:
                 messagebox.showerror("Import Error", f"Failed to import data: {e}")
 
-    def _copy_only_values_to_sheet(self, ws, rb_sheet, rowcolvals, date_cells_formats={}):
-        # rowcolvals: list of (row, col, value), for date cells, use date_cells_formats dict to format as string
-        for (row, col, value) in rowcolvals:
-            fmt = None
-            if (row, col) in date_cells_formats:
-                fmt = date_cells_formats[(row, col)]
-            if fmt:
-                # Format date string for Excel (write as string)
-                if isinstance(value, (int, float)):
-                    value = xlrd.xldate.xldate_as_datetime(value, 0).strftime(fmt)
-                elif isinstance(value, str):
-                    try:
-                        # Try parsing as xldate float
-                        val_float = float(value)
-                        value = xlrd.xldate.xldate_as_datetime(val_float, 0).strftime(fmt)
-                    except Exception:
-                        pass
-            ws.write(row, col, value)
+    def merge_json_data(self):
+        import_paths = filedialog.askopenfilenames(
+            filetypes=[("Data Files", "*.json *.jvib"), ("JSON Files", "*.json"), ("Compressed Data Bundle", "*.jvib")],
+            title="Select Data Files to Merge"
+        )
+        if not import_paths:
+            return
+        rule = messagebox.askyesnocancel(
+            "Merge Conflicts",
+            "When a store appears in more than one place, keep the newest copy automatically?\n\n"
+            "Yes: newest wins\nNo: ask me for each conflicting store")
+        if rule is None:
+            return
+
+        def content(record):
+            return json.dumps([record.get("inventory"), record.get("foil"), record.get("items")], sort_keys=True)
+
+        # store -> (record, timestamp, source); starts from what is loaded now
+        merged = {store: (rec, rec.get("updated", ""), "current data") for store, rec in self.data.items()}
+        changed = set()
+        template = None
+        try:
+            for path in import_paths:
+                source = os.path.basename(path)
+                fallback = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")
+                for section, store, value in iter_data_file(path):
+                    if section == "exported":
+                        fallback = str(value)
+                    elif section == "template":
+                        if not self.template and template is None and value:
+                            template = value
+                    elif section == "data" and isinstance(value, dict):
+                        store = store_key(store)
+                        stamp = value.get("updated") or fallback
+                        current = merged.get(store)
+                        if current is not None:
+                            if content(current[0]) == content(value):
+                                continue
+                            if rule:
+                                take = stamp > current[1]
+                            else:
+                                take = messagebox.askyesno(
+                                    "Store Conflict",
+                                    f"Store {store} differs between files.\n\n"
+                                    f"Keep: {current[2]} ({current[1] or 'no date'})\n"
+                                    f"Or use: {source} ({stamp})?\n\n"
+                                    f"Yes uses {source}.")
+                            if not take:
+                                continue
+                        value["updated"] = stamp
+                        merged[store] = (value, stamp, source)
+                        changed.add(store)
+        except Exception as e:
+            messagebox.showerror("Merge Error", f"Failed to merge '{source}': {e}\nNothing was changed.")
+            return
+
+        if changed or template is not None:
+            self.take_snapshot("Before merge")
+        for store in changed:
+            self.data[store] = merged[store][0]
+        if template is not None:
+            self.template = template
+        self.save_data(sorted(changed))
+        self.update_store_status_display(changed)
+        self.status.config(text=f"Merged {len(import_paths)} file(s): {len(changed)} store(s) added or updated.")
+
+    def _format_date_value(self, value, fmt):
+        # Format date string for Excel (write as string)
+        if isinstance(value, (int, float)):
+            value = xlrd.xldate.xldate_as_datetime(value, 0).strftime(fmt)
+        elif isinstance(value, str):
+            try:
+                # Try parsing as xldate float
+                val_float = float(value)
+                value = xlrd.xldate.xldate_as_datetime(val_float, 0).strftime(fmt)
+            except Exception:
+                pass
+        return value
+
+    def _export_backend(self, template_path, out_stem):
+        backend = EXPORT_BACKENDS.get(self.config.get("export_format", "xls"), XlsExportBackend)
+        return backend(template_path, out_stem + backend.extension)
 
     def export_inventory_to_template(self): 
         template_path = self.config.get("total_export_template", "")
         export_folder = self.config.get("inventory_export_path", "")
-        areas = self.config.get("export_inventory_areas", {})
 
         if not template_path or not os.path.exists(template_path):
             messagebox.showerror("Error", "No inventory template set or file does not exist.")
@@ -581,97 +1917,40 @@ class InventoryApp:
         except Exception:
             pass
 
-        out_path = os.path.join(export_folder, f"Final Inventory {date_str}.xls")
-        shutil.copy(template_path, out_path)
-        rb = xlrd.open_workbook(out_path, formatting_info=True)
-        wb = xl_copy(rb)
-        ws = wb.get_sheet(0)
-        rb_sheet = rb.sheet_by_index(0)
-
-        # Prepare values to write (row, col, value)
-        rowcolvals = []
-        date_row, date_col = self.parse_cell(areas.get("date_cell", "A2"))
-        rowcolvals.append((date_row, date_col, date_str))
-        date_cells_formats = {(date_row, date_col): "%m-%d-%Y"}
-
-        item_row, item_col = self.parse_cell(areas.get("item_start_cell", "A5"))
-        for i, item_display in enumerate(item_names):
-            rowcolvals.append((item_row + i, item_col, item_display))
-
-        store_col_row, store_col_col = self.parse_cell(areas.get("store_col_start", "B5"))
-        for store_idx, store in enumerate(stores):
-            col = store_col_col + store_idx
-            inv = self.data.get(store, {}).get("inventory", [""] * len(item_names))
-            for row_idx in range(len(item_names)):
-                rowcolvals.append((item_row + row_idx, col, inv[row_idx] if row_idx < len(inv) else ""))
-
-        self._copy_only_values_to_sheet(ws, rb_sheet, rowcolvals, date_cells_formats=date_cells_formats)
-
-        # === FORMATTING STARTS HERE ===
-
-        # Style A2
-        style_a2 = xlwt.XFStyle()
-        font_a2 = xlwt.Font()
-        font_a2.name = 'Arial'
-        font_a2.height = 12 * 20
-        style_a2.font = font_a2
-        align_center = xlwt.Alignment()
-        align_center.horz = xlwt.Alignment.HORZ_CENTER
-        align_center.vert = xlwt.Alignment.VERT_CENTER
-        style_a2.alignment = align_center
-        ws.write(date_row, date_col, date_str, style_a2)
-
-        # Style A5:A34
-        style_a_col = xlwt.XFStyle()
-        font_a = xlwt.Font()
-        font_a.name = 'Times New Roman'
-        font_a.height = 9 * 20
-        style_a_col.font = font_a
-        align_left = xlwt.Alignment()
-        align_left.horz = xlwt.Alignment.HORZ_LEFT
-        align_left.vert = xlwt.Alignment.VERT_CENTER
-        style_a_col.alignment = align_left
-        for i in range(len(item_names)):
-            ws.write(item_row + i, item_col, item_names[i], style_a_col)
-
-        # Style B5:AE34
-        style_b_to_ae = xlwt.XFStyle()
-        font_b = xlwt.Font()
-        font_b.name = 'Arial Narrow'
-        font_b.height = 8 * 20
-        style_b_to_ae.font = font_b
-        style_b_to_ae.alignment = align_center
-        borders = xlwt.Borders()
-        borders.left = borders.right = borders.top = borders.bottom = xlwt.Borders.THIN
-        borders.inner = xlwt.Borders.DOTTED
-        style_b_to_ae.borders = borders
-        for row_idx in range(len(item_names)):
-            for col in range(store_col_col, store_col_col + len(stores)):
-                val = self.data.get(stores[col - store_col_col], {}).get("inventory", [""] * len(item_names))[row_idx]
-                ws.write(item_row + row_idx, col, val, style_b_to_ae)
-
-        # Style and formula AF5:AF34
-        style_af = xlwt.XFStyle()
-        font_af = xlwt.Font()
-        font_af.name = 'Arial'
-        font_af.height = 8 * 20
-        style_af.font = font_af
-        style_af.alignment = align_center
-        for row_idx in range(len(item_names)):
-            excel_row = item_row + row_idx + 1  # Excel rows are 1-based
-            formula = f"SUM(B{excel_row}:AE{excel_row})"
-            ws.write(item_row + row_idx, store_col_col + len(stores), xlwt.Formula(formula), style_af)
-
-        # === END FORMATTING ===
-
-        wb.save(out_path)
+        backend = self._export_backend(template_path, os.path.join(export_folder, f"Final Inventory {date_str}"))
+        out_path = backend.out_path
+
+        # Cell plan: (row, col, 2-D block of values, style), shared by every export backend
+        plan = []
+        date_row, date_col = self.area_plan.cell("export_inventory_areas", "date_cell")
+        plan.append((date_row, date_col, [[date_str]], "a2"))
+
+        item_row, item_col = self.area_plan.cell("export_inventory_areas", "item_start_cell")
+        plan.append((item_row, item_col, [[name] for name in item_names], "a_col"))
+
+        store_col_row, store_col_col = self.area_plan.cell("export_inventory_areas", "store_col_start")
+        keys = self.template_item_keys()
+        columns = [self.store_inventory(store, keys) for store in stores]
+        counts = [[inv[row_idx] if row_idx < len(inv) else "" for inv in columns] for row_idx in range(len(item_names))]
+        if stores:
+            plan.append((item_row, store_col_col, counts, "b_to_ae"))
+
+        # Row totals right of the last store column
+        first_col = idx2colname(store_col_col)
+        last_col = idx2colname(store_col_col + max(len(stores), 1) - 1)
+        totals = [[ExcelFormula(f"SUM({first_col}{item_row + row_idx + 1}:{last_col}{item_row + row_idx + 1})")]
+                  for row_idx in range(len(item_names))]  # Excel rows are 1-based
+        plan.append((item_row, store_col_col + len(stores), totals, "af"))
+
+        backend.write(plan)
+        backend.save()
+        self.start_inventory_indexer()
         self.status.config(text=f"Inventory exported to {out_path}")
         messagebox.showinfo("Export Complete", f"Inventory exported to {out_path}")
 
     def export_foil_to_template(self):
         template_path = self.config.get("foil_template", "")
         export_folder = self.config.get("foil_export_path", "")
-        areas = self.config.get("export_foil_areas", {})
         if not template_path or not os.path.exists(template_path):
             messagebox.showerror("Error", "No foil pan template set or file does not exist.")
             return
@@ -688,32 +1967,160 @@ class InventoryApp:
                 date_str = xlrd.xldate.xldate_as_datetime(float(date_str), 0).strftime("%m-%d-%Y")
         except Exception:
             pass
-        out_path = os.path.join(export_folder, f"Foil Pan Order {date_str}.xls")
-        shutil.copy(template_path, out_path)
-        rb = xlrd.open_workbook(out_path, formatting_info=True)
-        wb = xl_copy(rb)
-        ws = wb.get_sheet(0)
-        rb_sheet = rb.sheet_by_index(0)
+        backend = self._export_backend(template_path, os.path.join(export_folder, f"Foil Pan Order {date_str}"))
+        out_path = backend.out_path
 
-        # Prepare values to write (row, col, value)
-        rowcolvals = []
-        date_row, date_col = self.parse_cell(areas.get("date_cell", "A2"))
-        rowcolvals.append((date_row, date_col, date_str))
-        date_cells_formats = {(date_row, date_col): "%m-%d-%Y"}
+        # Cell plan: (row, col, 2-D block of values, style); foil exports keep the template's own formatting
+        plan = []
+        date_row, date_col = self.area_plan.cell("export_foil_areas", "date_cell")
+        plan.append((date_row, date_col, [[self._format_date_value(date_str, "%m-%d-%Y")]], None))
 
         # Write store and foil data starting from user-defined cell
-        store_row, store_col = self.parse_cell(areas.get("store_start_cell", "B5"))
-        for i, store in enumerate(stores):
-            rowcolvals.append((store_row + i, store_col, store))
+        store_row, store_col = self.area_plan.cell("export_foil_areas", "store_start_cell")
+        block = []
+        for store in stores:
             foil = self.data.get(store, {}).get("foil", [""] * 4)
-            for j in range(4):
-                rowcolvals.append((store_row + i, store_col + 1 + j, foil[j] if len(foil) > j else ""))
+            block.append([store] + [foil[j] if len(foil) > j else "" for j in range(4)])
+        plan.append((store_row, store_col, block, None))
 
-        self._copy_only_values_to_sheet(ws, rb_sheet, rowcolvals, date_cells_formats=date_cells_formats)
-        wb.save(out_path)
+        backend.write(plan)
+        backend.save()
+        try:
+            self.foil_forecaster.add_export(out_path, {store: self.data.get(store, {}).get("foil", []) for store in stores})
+        except OSError:
+            pass
         self.status.config(text=f"Foil pan order exported to {out_path}")
         messagebox.showinfo("Export Complete", f"Foil pan order exported to {out_path}")
 
+    def open_foil_forecast(self):
+        folder = self.config.get("foil_export_path", "")
+        stores = self.get_all_stores()
+        store_row, store_col = self.area_plan.cell("export_foil_areas", "store_start_cell")
+
+        win = tk.Toplevel(self.root)
+        win.title("Foil Pan Forecast")
+        win.geometry("900x500")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+        info = ttk.Label(frame, text="Indexing past foil pan orders...")
+        info.pack(side="top", anchor="w")
+
+        columns = ["Store"]
+        for j in range(1, 5):
+            columns += [f"Pan {j}", f"Pan {j} Sug."]
+        yscroll = ttk.Scrollbar(frame, orient="vertical")
+        yscroll.pack(side="right", fill="y")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", yscrollcommand=yscroll.set)
+        yscroll.config(command=tree.yview)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=70 if col == "Store" else 80, anchor="center")
+        tree.pack(fill="both", expand=True)
+
+        def show():
+            tree.delete(*tree.get_children())
+            suggestions = self.foil_forecaster.suggest(stores)
+            for store in stores:
+                foil = self.data.get(store, {}).get("foil", [])
+                sug = suggestions.get(store, [""] * 4)
+                row = [store]
+                for j in range(4):
+                    row += [foil[j] if j < len(foil) else "", sug[j]]
+                tree.insert("", "end", values=row)
+            weeks = min(len(self.foil_forecaster.entries), FOIL_FORECAST_WEEKS)
+            info.config(text=f"{len(self.foil_forecaster.entries)} past orders indexed; "
+                             f"suggestions use the last {weeks} week(s).")
+
+        if not folder or not os.path.isdir(folder):
+            show()
+            info.config(text="No foil pan export folder set; suggestions use cached history only.")
+            return
+        worker = threading.Thread(target=self.foil_forecaster.refresh, args=(folder, store_row, store_col), daemon=True)
+        worker.start()
+
+        def wait():
+            if not win.winfo_exists():
+                return
+            if worker.is_alive():
+                win.after(100, wait)
+            else:
+                show()
+
+        wait()
+
+    def start_inventory_indexer(self):
+        folder = self.config.get("inventory_export_path", "")
+        if not folder or not os.path.isdir(folder):
+            return
+        if self.index_thread and self.index_thread.is_alive():
+            return
+        item_row, item_col = self.area_plan.cell("export_inventory_areas", "item_start_cell")
+        _, store_col = self.area_plan.cell("export_inventory_areas", "store_col_start")
+        self.index_thread = threading.Thread(
+            target=self.inventory_index.update,
+            args=(folder, item_row, item_col, store_col, self.get_all_stores()),
+            daemon=True)
+        self.index_thread.start()
+
+    def open_item_history(self):
+        self.start_inventory_indexer()
+        win = tk.Toplevel(self.root)
+        win.title("Item History")
+        win.geometry("520x500")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+
+        ttk.Label(frame, text="Item").grid(row=0, column=0, sticky="e", padx=3)
+        item_var = tk.StringVar()
+        item_box = ttk.Combobox(frame, textvariable=item_var, width=45)
+        item_box.grid(row=0, column=1, columnspan=3, sticky="we", pady=2)
+        ttk.Label(frame, text="Store").grid(row=1, column=0, sticky="e", padx=3)
+        store_var = tk.StringVar()
+        ttk.Combobox(frame, textvariable=store_var, values=self.get_all_stores(), width=8).grid(row=1, column=1, sticky="w", pady=2)
+        ttk.Label(frame, text="Weeks").grid(row=1, column=2, sticky="e", padx=3)
+        weeks_var = tk.IntVar(value=52)
+        ttk.Spinbox(frame, from_=1, to=520, textvariable=weeks_var, width=6).grid(row=1, column=3, sticky="w", pady=2)
+
+        tree = ttk.Treeview(frame, columns=["Date", "Count"], show="headings", height=15)
+        tree.heading("Date", text="Date")
+        tree.heading("Count", text="Count")
+        tree.column("Date", width=150, anchor="center")
+        tree.column("Count", width=100, anchor="center")
+        tree.grid(row=3, column=0, columnspan=4, sticky="nsew", pady=5)
+        frame.grid_rowconfigure(3, weight=1)
+        frame.grid_columnconfigure(1, weight=1)
+        info = ttk.Label(frame, text="")
+        info.grid(row=4, column=0, columnspan=4, sticky="w")
+
+        def load_items():
+            if not win.winfo_exists():
+                return
+            item_box["values"] = self.inventory_index.items()
+            if self.index_thread and self.index_thread.is_alive():
+                info.config(text="Indexing past Final Inventory exports...")
+                win.after(500, load_items)
+            else:
+                info.config(text=f"{self.inventory_index.weeks()} Final Inventory exports indexed.")
+
+        def search(event=None):
+            item, store = item_var.get().strip(), store_var.get().strip()
+            if not item or not store:
+                return
+            try:
+                weeks = int(weeks_var.get())
+            except (tk.TclError, ValueError):
+                weeks = 52
+            rows = self.inventory_index.query(item, store, weeks)
+            tree.delete(*tree.get_children())
+            for date, count in rows:
+                tree.insert("", "end", values=[date, f"{count:g}"])
+            total = sum(count for _, count in rows)
+            info.config(text=f"{len(rows)} week(s) found, total {total:g}.")
+
+        ttk.Button(frame, text="Search", command=search).grid(row=2, column=3, sticky="e", pady=2)
+        win.bind("<Return>", search)
+        load_items()
+
     def export_combo(self):
         self.export_inventory_to_template()
         self.export_foil_to_template()
@@ -757,6 +2164,15 @@ class InventoryApp:
             style.configure("Treeview.Heading", font=heading_font, padding=[0, 0, 0, 0])
             # DO NOT call style.layout("Treeview.Cell", ...)
 
+            search_frame = ttk.Frame(editor_frame)
+            search_frame.pack(side="top", fill="x", pady=(0, 5))
+            ttk.Label(search_frame, text="Find item or #store:").pack(side="left")
+            search_var = tk.StringVar()
+            search_entry = ttk.Entry(search_frame, textvariable=search_var, width=40)
+            search_entry.pack(side="left", padx=5)
+            search_info = ttk.Label(search_frame, text="")
+            search_info.pack(side="left", padx=5)
+
             xscroll = tk.Scrollbar(editor_frame, orient="horizontal")
             xscroll.pack(side="bottom", fill="x")
             yscroll = tk.Scrollbar(editor_frame, orient="vertical")
@@ -785,13 +2201,60 @@ class InventoryApp:
 
             self.status.config(text=f"Table editor: {len(item_names)} items, {len(stores)} stores.")
 
+            item_keys = self.template_item_keys()
+            store_invs = [self.store_inventory(store, item_keys) for store in stores]
+            row_ids = []
             for idx, item_name in enumerate(item_names):
                 row_vals = [item_name]
-                for store in stores:
-                    inv = self.data.get(store, {}).get("inventory", [""] * n_items)
+                for inv in store_invs:
                     val = inv[idx] if idx < len(inv) else ""
                     row_vals.append(str(val))
-                tree.insert("", "end", values=row_vals, tags=(f"row_{idx}",))
+                row_ids.append(tree.insert("", "end", values=row_vals, tags=(f"row_{idx}",)))
+
+            search_index = ItemSearchIndex(item_names, stores)
+            search_state = {"rows": [], "pos": 0, "store_col": None}
+
+            def show_store_column(col):
+                prev = search_state["store_col"]
+                if prev is not None:
+                    tree.heading(stores[prev], text=stores[prev])
+                search_state["store_col"] = col
+                if col is None:
+                    return
+                tree.heading(stores[col], text=f"[{stores[col]}]")
+                widths = [tree.column(c, "width") for c in columns]
+                tree.xview_moveto(sum(widths[1:col + 1]) / max(sum(widths), 1))
+
+            def show_match():
+                rows = search_state["rows"]
+                if not rows:
+                    return
+                rowid = row_ids[rows[search_state["pos"]]]
+                tree.selection_set(rowid)
+                tree.focus(rowid)
+                tree.see(rowid)
+                search_info.config(text=f"{search_state['pos'] + 1} of {len(rows)}")
+
+            def on_search(*args):
+                rows, store_col = search_index.search(search_var.get())
+                if store_col != search_state["store_col"]:
+                    show_store_column(store_col)
+                search_state["rows"] = rows or []
+                search_state["pos"] = 0
+                if rows:
+                    show_match()
+                else:
+                    tree.selection_set(())
+                    search_info.config(text="No matching items" if rows is not None else "")
+
+            def next_match(event=None):
+                if search_state["rows"]:
+                    search_state["pos"] = (search_state["pos"] + 1) % len(search_state["rows"])
+                    show_match()
+
+            search_var.trace_add("write", on_search)
+            search_entry.bind("<Return>", next_match)
+            search_entry.focus()
 
             def on_double_click(event):
                 region = tree.identify("region", event.x, event.y)
@@ -820,18 +2283,27 @@ class InventoryApp:
             tree.bind("<Double-1>", on_double_click)
 
             def save_table_edits():
+                self.take_snapshot("Before table edits")
+                new_invs = {store: [""] * n_items for store in stores}
                 for idx, rowid in enumerate(tree.get_children()):
                     values = tree.item(rowid)["values"]
                     for col_idx, store in enumerate(stores, start=1):
-                        val = values[col_idx]
-                        inv = self.data.get(store, {}).get("inventory", [""] * n_items)
-                        while len(inv) < n_items:
-                            inv.append("")
-                        inv[idx] = val
-                        foil = self.data.get(store, {}).get("foil", [""]*4)
-                        self.data[store] = {"inventory": inv, "foil": foil}
-                self.save_data()
-                self.update_store_status_display()
+                        new_invs[store][idx] = values[col_idx]
+                changed = []
+                for store, inv in new_invs.items():
+                    old = [str(v) for v in self.store_inventory(store, item_keys)]
+                    if store in self.data and old == [str(v) for v in inv]:
+                        continue
+                    if store not in self.data and not any(str(v) for v in inv):
+                        continue
+                    record = self.data.get(store, {})
+                    items = dict(record.get("items", {}))
+                    items.update(self.keyed_items(inv, item_keys))
+                    self.data[store] = {"inventory": inv, "items": items, "foil": record.get("foil", [""]*4),
+                                        "updated": datetime.now().isoformat(timespec="seconds")}
+                    changed.append(store)
+                self.save_data(changed)
+                self.update_store_status_display(changed)
                 messagebox.showinfo("Saved", "All table edits have been saved.")
                 editor.lift()
                 self.status.config(text="All table edits saved.")
@@ -916,17 +2388,87 @@ class InventoryApp:
         ttk.Button(frame, text="Close", command=win.destroy).grid(row=4, column=0, columnspan=3, pady=8)
 
     def clear_all_data(self):
-        if messagebox.askyesno("Confirm", "Are you sure you want to CLEAR ALL imported item data and store data? This cannot be undone."):
+        if messagebox.askyesno("Confirm", "Are you sure you want to CLEAR ALL imported item data and store data? You can undo this from the Data menu."):
+            self.take_snapshot("Before clear all data")
             self.data = {}
             self.template = {}
             self.save_data()
             self.update_store_status_display()
             self.status.config(text="All data cleared.")
 
+    def take_snapshot(self, label):
+        try:
+            self.snapshots.snapshot(label, self.data, self.template, self.config)
+        except OSError as e:
+            self.status.config(text=f"Warning: could not save snapshot: {e}")
+
+    def _apply_snapshot(self, restored):
+        data, template, config = restored
+        changed = [store for store in set(self.data) | set(data)
+                   if json.dumps(self.data.get(store), sort_keys=True) != json.dumps(data.get(store), sort_keys=True)]
+        self.data = data
+        self.template = template
+        for key in SNAPSHOT_CONFIG_KEYS:
+            if key in config:
+                self.config[key] = config[key]
+        self.compile_areas()
+        self.save_data(changed)
+        self.save_config()
+        self.update_store_status_display()
+
+    def undo_last_change(self):
+        if not self.snapshots.versions:
+            messagebox.showinfo("Undo", "There is nothing to undo.")
+            return
+        version = self.snapshots.versions[-1]
+        if not messagebox.askyesno("Undo", f"Undo '{version['label']}' from {version['time']}?"):
+            return
+        try:
+            self._apply_snapshot(self.snapshots.restore(version))
+            self.snapshots.pop()
+        except Exception as e:
+            messagebox.showerror("Undo Error", f"Failed to undo: {e}")
+            return
+        self.status.config(text=f"Undone: {version['label']}")
+
+    def restore_snapshot_dialog(self):
+        versions = list(reversed(self.snapshots.versions))
+        if not versions:
+            messagebox.showinfo("Restore Snapshot", "No snapshots have been taken yet.")
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Restore Snapshot")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill="both", expand=True)
+        listbox = tk.Listbox(frame, width=60, height=min(len(versions), 15), font=("Arial", 9))
+        listbox.pack(fill="both", expand=True)
+        for version in versions:
+            listbox.insert(tk.END, f"{version['time'].replace('T', ' ')}  {version['label']}  ({len(version['stores'])} stores)")
+
+        def restore():
+            sel = listbox.curselection()
+            if not sel:
+                return
+            version = versions[sel[0]]
+            try:
+                # Read the version first: the new snapshot may prune it if it is the oldest.
+                restored = self.snapshots.restore(version)
+                self.take_snapshot("Before restore")
+                self._apply_snapshot(restored)
+            except Exception as e:
+                messagebox.showerror("Restore Error", f"Failed to restore snapshot: {e}", parent=win)
+                return
+            self.status.config(text=f"Restored snapshot: {version['label']} ({version['time']})")
+            win.destroy()
+
+        ttk.Button(frame, text="Restore Selected", command=restore).pack(side="left", pady=8)
+        ttk.Button(frame, text="Close", command=win.destroy).pack(side="right", pady=8)
+
 def main():
     root = tk.Tk()
     app = InventoryApp(root)
     root.mainloop()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     main()